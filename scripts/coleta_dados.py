@@ -2,131 +2,178 @@ import os
 import csv
 import json
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# ijson lê o relatório de forma incremental (usando o backend C yajl2_c quando
+# disponível); sem ele caímos no json.load, que carrega o arquivo inteiro
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Colunas do CSV final, na mesma ordem das tuplas geradas por process_json
+FIELDNAMES = ("project", "test_name", "outcome", "lineno", "environment")
+
+# Pastas que nunca contêm os relatórios e só deixam a busca mais lenta
+SKIP_DIRS = {".git", "__pycache__", "node_modules"}
+
+# Trechos procurados no nome (já em minúsculas), em ordem de prioridade
+ENVIRONMENT_KEYWORDS = (
+    ("mac", "mac"),
+    ("linux", "linux"),
+    ("ubuntu", "linux"),
+    ("win", "windows"),
+)
 
 def detect_environment(name):
     name = name.lower()
-    if "mac" in name:
-        return "mac"
-    elif "linux" in name or "ubuntu" in name:
-        return "linux"
-    elif "windows" in name or "win" in name:
-        return "windows"
-    else:
-        return "unknown"
+    for keyword, environment in ENVIRONMENT_KEYWORDS:
+        if keyword in name:
+            return environment
+    return "unknown"
 
 def get_project_info_from_csv(csv_path):
     with open(csv_path, newline='') as f:
         reader = csv.reader(f)
-        lines = list(reader)
-        if len(lines) < 2:
+        try:
+            next(reader)                # cabeçalho
+            second_line = next(reader)  # primeira linha de dados
+        except StopIteration:
             return None, None
-        second_line = lines[1]
-        line_str = ','.join(second_line)
-        project_name = line_str.split(",")[0].strip()
-        environment = line_str.split(",")[-1].strip()
+        if not second_line:
+            return None, None
+        # Usa os campos já separados pelo csv.reader (respeita aspas)
+        project_name = second_line[0].strip()
+        environment = second_line[-1].strip()
         return project_name, environment
 
+def find_csv_json(root):
+    csv_file = None
+    json_file = None
+    pending = deque([root])
+
+    # Busca em largura com os.scandir: os DirEntry já trazem o tipo do arquivo,
+    # então não há stat extra por entrada, e paramos assim que achamos os dois
+    while pending:
+        current = pending.popleft()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_file(follow_symlinks=False):
+                        if entry.name.endswith(".csv") and csv_file is None:
+                            csv_file = entry.path
+                        elif entry.name.endswith(".json") and json_file is None:
+                            json_file = entry.path
+                        if csv_file and json_file:
+                            return csv_file, json_file
+                    elif entry.is_dir(follow_symlinks=False):
+                        if entry.name.startswith(".") or entry.name in SKIP_DIRS:
+                            continue
+                        pending.append(entry.path)
+        except OSError:
+            continue
+
+    return csv_file, json_file
+
 def process_json(file_path, project, environment):
-    with open(file_path, "r") as f:
-        data = json.load(f)
-
-    rows = []
-    for test in data.get("tests", []):
-        nodeid = test.get("nodeid")
-        stages = ["setup", "call", "teardown"]
-
-        for stage in stages:
-            stage_data = test.get(stage)
-            if stage_data:
-                outcome = stage_data.get("outcome")
-                crash = stage_data.get("crash", {})
-                lineno = crash.get("lineno", test.get("lineno"))
-                rows.append({
-                    "project": project,
-                    "test_name": nodeid,
-                    "outcome": outcome,
-                    "lineno": lineno,
-                    "environment": environment
-                })
-                break
-
-    for collector in data.get("collectors", []):
-        if collector.get("outcome") == "failed":
-            rows.append({
-                "project": project,
-                "test_name": collector.get("nodeid", "<unknown>"),
-                "outcome": "collection_error",
-                "lineno": None,
-                "environment": environment
-            })
-
-    return rows
+    with open(file_path, "rb") as f:
+        if ijson is not None:
+            tests = ijson.items(f, "tests.item")
+        else:
+            data = json.load(f)
+            tests = data.get("tests", [])
+
+        # Projeto e ambiente são fixos nesta chamada, então (nodeid, outcome)
+        # basta para descartar linhas repetidas antes de irem para o CSV
+        seen = set()
+
+        for test in tests:
+            nodeid = test.get("nodeid")
+            stages = ["setup", "call", "teardown"]
+
+            for stage in stages:
+                stage_data = test.get(stage)
+                if stage_data:
+                    outcome = stage_data.get("outcome")
+                    crash = stage_data.get("crash", {})
+                    lineno = crash.get("lineno", test.get("lineno"))
+                    key = (nodeid, outcome)
+                    if key in seen:
+                        break
+                    seen.add(key)
+                    yield (project, nodeid, outcome, lineno, environment)
+                    break
 
-def main():
-    if len(sys.argv) != 2:
-        print(f"Uso: python {os.path.basename(__file__)} <pasta_base>")
-        sys.exit(1)
+        if ijson is not None:
+            # Segunda passada só para os collectors
+            f.seek(0)
+            collectors = ijson.items(f, "collectors.item")
+        else:
+            collectors = data.get("collectors", [])
 
-    base_dir = sys.argv[1]
-    output_path = os.path.join(base_dir, "final_all.csv")
+        for collector in collectors:
+            if collector.get("outcome") == "failed":
+                nodeid = collector.get("nodeid", "<unknown>")
+                key = (nodeid, "collection_error")
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield (project, nodeid, "collection_error", None, environment)
 
-    # Escreve o cabeçalho uma vez no início
-    with open(output_path, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["project", "test_name", "outcome", "lineno", "environment"])
-        writer.writeheader()
+def process_subdir(subpath):
+    # Não escreve nada no CSV final: devolve as linhas e as mensagens de log
+    # para o processo principal
+    messages = []
 
-    for subdir in os.listdir(base_dir):
-        subpath = os.path.join(base_dir, subdir)
-        if not os.path.isdir(subpath):
-            continue
+    # print(f'Processando subdir: {subpath}')
 
-        csv_file = None
-        json_file = None
-
-        # print(f'Processando subdir: {subpath}')
-
-        # os.walk percorre recursivamente todas as subpastas
-        for root, dirs, files in os.walk(subpath):
-            for file in files:
-                if file.endswith(".csv") and csv_file is None:
-                    csv_file = os.path.join(root, file)
-                    # print(f'  CSV encontrado: {csv_file}')
-                elif file.endswith(".json") and json_file is None:
-                    json_file = os.path.join(root, file)
-                    # print(f'  JSON encontrado: {json_file}')
-                
-                # Para quando encontrar ambos os arquivos
-                if csv_file and json_file:
-                    break
-            
-            if csv_file and json_file:
-                break
+    csv_file, json_file = find_csv_json(subpath)
 
-        # Processar os arquivos encontrados
-        # if csv_file or json_file:
-        print(f'  Arquivos finais - CSV: {csv_file}, JSON: {json_file}')
-        # Aqui você faria o processamento dos arquivos
+    # Processar os arquivos encontrados
+    # if csv_file or json_file:
+    messages.append(f'  Arquivos finais - CSV: {csv_file}, JSON: {json_file}')
 
+    if not csv_file or not json_file:
+        messages.append(f"⚠️  Arquivos CSV ou JSON faltando em {subpath}")
+        return [], messages
 
-        if not csv_file or not json_file:
-            print(f"⚠️  Arquivos CSV ou JSON faltando em {subpath}")
-            continue
+    project_name, env_from_csv = get_project_info_from_csv(csv_file)
+    if not project_name:
+        messages.append(f"⚠️  Não foi possível extrair informações de {csv_file}")
+        return [], messages
 
-        project_name, env_from_csv = get_project_info_from_csv(csv_file)
-        if not project_name:
-            print(f"⚠️  Não foi possível extrair informações de {csv_file}")
-            continue
+    environment = env_from_csv or detect_environment(csv_file)
+    rows = list(process_json(json_file, project_name, environment))
 
-        environment = env_from_csv or detect_environment(csv_file)
-        rows = process_json(json_file, project_name, environment)
+    messages.append(f"✅ Processado: {subpath} ({len(rows)} testes)")
+    return rows, messages
 
-        # Append ao CSV conforme processa cada pasta
-        with open(output_path, "a", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=["project", "test_name", "outcome", "lineno", "environment"])
-            for row in rows:
-                writer.writerow(row)
+def main():
+    if len(sys.argv) != 2:
+        print(f"Uso: python {os.path.basename(__file__)} <pasta_base>")
+        sys.exit(1)
+
+    base_dir = sys.argv[1]
+    output_path = os.path.join(base_dir, "final_all.csv")
 
-        print(f"✅ Processado: {subpath} ({len(rows)} testes)")
+    # Abre o CSV de saída uma única vez e reaproveita o mesmo writer
+    with open(output_path, "w", newline="", buffering=1 << 20) as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
+
+        # DirEntry.is_dir() usa o tipo já devolvido pelo readdir, sem um stat por pasta
+        with os.scandir(base_dir) as it:
+            subpaths = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+
+        # Cada subpasta é independente: o processamento roda em paralelo e só
+        # o processo principal escreve no CSV, na mesma ordem das subpastas
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for rows, messages in executor.map(process_subdir, subpaths, chunksize=4):
+                for message in messages:
+                    print(message)
+                if rows:
+                    writer.writerows(rows)
 
     print(f"\n🏁 Arquivo final salvo em: {output_path}")
 
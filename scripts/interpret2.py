@@ -1,32 +1,94 @@
+import glob
+import hashlib
+import os
+import numpy as np
 import pandas as pd
 import sys
-from typing import List, Dict, Set
+from typing import List, Dict, Set, Union
 
-def analyze_flaky_tests(csv_file_path: str) -> pd.DataFrame:
+# Only these columns are needed for the analysis ('lineno' is skipped)
+USED_COLUMNS = ['project', 'test_name', 'outcome', 'environment']
+
+# Directory where analysis results are cached between runs
+CACHE_DIR = "cache"
+
+# Part of every cache key: any edit to this script invalidates old entries
+with open(__file__, 'rb') as _source:
+    ANALYSIS_VERSION = hashlib.sha1(_source.read()).hexdigest()
+
+def load_test_results(csv_file_path: str) -> pd.DataFrame:
+    """
+    Loads the test results CSV keeping only the columns used by the analysis.
+    
+    The pyarrow CSV engine is tried first: it parses in parallel and builds
+    the categorical columns from dictionary-encoded Arrow arrays. If pyarrow
+    is not installed, or the headers need stripping (which the pyarrow engine
+    can't do since it only accepts a fixed list of column names), the default
+    C engine is used instead.
+    
+    Args:
+        csv_file_path (str): Path to the CSV file containing test results
+        
+    Returns:
+        pd.DataFrame: DataFrame with categorical project, test_name, outcome
+        and environment columns
+    """
+    
+    try:
+        return pd.read_csv(
+            csv_file_path,
+            engine='pyarrow',
+            usecols=USED_COLUMNS,
+            dtype='category',
+        )
+    except (ImportError, KeyError, ValueError):
+        pass
+    
+    df = pd.read_csv(
+        csv_file_path,
+        usecols=lambda column: column.strip() in USED_COLUMNS,
+        dtype='category',
+    )
+    
+    # Strip whitespace from headers (common CSV issue)
+    df.columns = df.columns.str.strip()
+    
+    return df
+
+def analyze_flaky_tests(test_results: Union[str, pd.DataFrame]) -> pd.DataFrame:
     """
-    Analyzes a CSV file containing test results to identify flaky tests.
+    Analyzes test results to identify flaky tests.
     
     A flaky test is defined as a test that fails on some operating systems
     but not on others (i.e., appears in some environments but not all).
     
     Args:
-        csv_file_path (str): Path to the CSV file containing test results
+        test_results (str | pd.DataFrame): Path to the CSV file containing test
+            results, or a DataFrame already loaded with load_test_results
+            (avoids parsing the same file again)
         
     Returns:
         pd.DataFrame: DataFrame containing flaky tests with their environment details
     """
     
+    csv_file_path = test_results if isinstance(test_results, str) else "<DataFrame>"
+    
     try:
-        # Read the CSV file
-        df = pd.read_csv(csv_file_path)
-        
-        # Strip whitespace from headers (common CSV issue)
-        df.columns = df.columns.str.strip()
+        if isinstance(test_results, pd.DataFrame):
+            # The analysis reads environments and projects from the categories,
+            # so drop the ones left behind if the frame was filtered
+            df = test_results[USED_COLUMNS].astype('category')
+            for column in USED_COLUMNS:
+                df[column] = df[column].cat.remove_unused_categories()
+        else:
+            # Read the CSV file, loading only the needed columns as categoricals
+            # (few distinct values each) instead of per-cell Python strings
+            df = load_test_results(test_results)
         
         print(f"Loaded {len(df)} test failure records from {csv_file_path}")
         print(f"Columns found: {list(df.columns)}")
-        print(f"Unique environments: {sorted(df['environment'].unique())}")
-        print(f"Unique projects: {len(df['project'].unique())}")
+        print(f"Unique environments: {sorted(df['environment'].cat.categories)}")
+        print(f"Unique projects: {len(df['project'].cat.categories)}")
         print()
         
     except FileNotFoundError:
@@ -36,54 +98,65 @@ def analyze_flaky_tests(csv_file_path: str) -> pd.DataFrame:
         print(f"Error reading CSV file: {e}")
         return pd.DataFrame()
     
-    # Create a unique identifier for each test (project + test_name)
-    df['test_id'] = df['project'] + '::' + df['test_name']
+    # A test is identified by (project, test_name); grouping on both columns
+    # directly keeps them in the index, so no synthetic id has to be built
+    test_key = ['project', 'test_name']
     
-    # Get all unique environments and test IDs
-    all_environments = set(df['environment'].unique())
-    all_test_ids = set(df['test_id'].unique())
+    # Get all unique environments (the categories, without a pass over the data)
+    environments = list(df['environment'].cat.categories)
+    all_environments = set(environments)
     
-    print(f"Total unique tests analyzed: {len(all_test_ids)}")
+    # Keep one row per (test, environment) pair, so summing the environment
+    # bits of a test is the same as OR-ing them
+    pairs = df[test_key + ['environment']].dropna(subset=['environment']).drop_duplicates()
+    
+    # Each environment is one bit of a uint64 mask; with more than 64
+    # environments fall back to (slower) Python int masks of any size
+    env_codes = pairs['environment'].cat.codes.to_numpy()
+    if len(environments) <= 64:
+        env_bits = np.left_shift(np.uint64(1), env_codes.astype(np.uint64))
+    else:
+        env_bits = np.left_shift(1, env_codes.astype(object))
+    masks = (
+        pd.Series(env_bits, index=pairs.index)
+        .groupby([pairs['project'], pairs['test_name']], observed=True)
+        .sum()
+    )
+    
+    print(f"Total unique tests analyzed: {len(masks)}")
     print(f"Environments found: {all_environments}")
     print()
     
-    # Group by test_id to see which environments each test fails in
-    test_environments = df.groupby('test_id')['environment'].apply(set).reset_index()
-    test_environments.columns = ['test_id', 'failing_environments']
-    
     # Identify flaky tests: tests that don't fail in ALL environments
     # Since the CSV only contains failing tests, a flaky test is one that 
     # appears in some environments but not others
-    flaky_tests = []
+    all_mask = (1 << len(environments)) - 1
+    flaky_masks = masks[masks != all_mask]
     
-    for _, row in test_environments.iterrows():
-        test_id = row['test_id']
-        failing_envs = row['failing_environments']
-        
-        # If the test doesn't fail in ALL environments, it's flaky
-        if failing_envs != all_environments:
-            missing_envs = all_environments - failing_envs
-            
-            flaky_tests.append({
-                'test_id': test_id,
-                'failing_environments': sorted(list(failing_envs)),
-                'passing_environments': sorted(list(missing_envs)),
-                'num_failing_envs': len(failing_envs),
-                'num_passing_envs': len(missing_envs)
-            })
-    
-    if not flaky_tests:
+    if flaky_masks.empty:
         print("No flaky tests found. All tests either:")
         print("- Fail consistently across all environments, or")
         print("- Only one environment was tested")
         return pd.DataFrame()
     
+    # Decode each distinct mask into environment names only once
+    decoded = {
+        int(mask): sorted(env for bit, env in enumerate(environments) if int(mask) >> bit & 1)
+        for mask in flaky_masks.unique()
+    }
+    failing_envs = [decoded[int(mask)] for mask in flaky_masks.values]
+    
     # Convert to DataFrame for better presentation
-    flaky_df = pd.DataFrame(flaky_tests)
+    flaky_df = pd.DataFrame({
+        'failing_environments': failing_envs,
+        'passing_environments': [sorted(all_environments.difference(envs)) for envs in failing_envs],
+        'num_failing_envs': [len(envs) for envs in failing_envs],
+    }, index=flaky_masks.index)
+    flaky_df['num_passing_envs'] = len(all_environments) - flaky_df['num_failing_envs']
     
-    # Add original test details
-    test_details = df[['test_id', 'project', 'test_name', 'outcome']].drop_duplicates()
-    flaky_result = flaky_df.merge(test_details, on='test_id', how='left')
+    # Add the outcome(s) recorded for each flaky test
+    outcomes = df[test_key + ['outcome']].drop_duplicates().set_index(test_key)
+    flaky_result = flaky_df.join(outcomes, how='left').reset_index()
     
     # Reorder columns for better readability
     column_order = ['project', 'test_name', 'outcome', 'failing_environments', 
@@ -92,6 +165,66 @@ def analyze_flaky_tests(csv_file_path: str) -> pd.DataFrame:
     
     return flaky_result
 
+def analyze_flaky_tests_cached(csv_file_path: str, cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """
+    Runs analyze_flaky_tests, reusing a cached result for an unchanged input.
+    
+    The cache entry is a parquet file named after a hash of the input path
+    plus a hash of its modification time, its size and the version of this
+    script, so editing the CSV or the analysis code invalidates it. Only the
+    latest entry per input path is kept. Caching is skipped when parquet
+    support (pyarrow) is not available.
+    
+    Empty results are not cached: analyze_flaky_tests also returns an empty
+    DataFrame when the CSV can't be read, and caching that would hide the
+    error on later runs.
+    
+    Args:
+        csv_file_path (str): Path to the CSV file containing test results
+        cache_dir (str): Directory holding the cached parquet files
+        
+    Returns:
+        pd.DataFrame: DataFrame containing flaky tests with their environment details
+    """
+    
+    try:
+        stat = os.stat(csv_file_path)
+    except OSError:
+        return analyze_flaky_tests(csv_file_path)
+    
+    path_key = hashlib.sha1(os.path.abspath(csv_file_path).encode()).hexdigest()[:16]
+    fingerprint = f"{stat.st_mtime}:{stat.st_size}:{ANALYSIS_VERSION}"
+    key = hashlib.sha1(fingerprint.encode()).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{path_key}-{key}.parquet")
+    
+    if os.path.exists(cache_path):
+        try:
+            flaky_tests = pd.read_parquet(cache_path)
+        except Exception as e:
+            print(f"Ignoring unreadable cache file {cache_path}: {e}")
+        else:
+            # Parquet list columns come back as numpy arrays
+            for column in ('failing_environments', 'passing_environments'):
+                flaky_tests[column] = flaky_tests[column].map(list)
+            print(f"Using cached analysis from {cache_path}")
+            print("(input and script unchanged; pass --no-cache to recompute)")
+            print()
+            return flaky_tests
+    
+    flaky_tests = analyze_flaky_tests(csv_file_path)
+    
+    if not flaky_tests.empty:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Drop older entries for the same input before saving the new one
+            for stale in glob.glob(os.path.join(cache_dir, f"{path_key}-*.parquet")):
+                os.remove(stale)
+            flaky_tests.to_parquet(cache_path, index=False)
+        except Exception as e:
+            print(f"Could not cache analysis results: {e}")
+    
+    return flaky_tests
+
 def print_flaky_analysis(flaky_tests: pd.DataFrame) -> None:
     """
     Prints a detailed analysis of flaky tests.
@@ -113,17 +246,16 @@ def print_flaky_analysis(flaky_tests: pd.DataFrame) -> None:
     print()
     
     # Group by project for better organization
-    for project in sorted(flaky_tests['project'].unique()):
-        project_tests = flaky_tests[flaky_tests['project'] == project]
-        
+    for project, project_tests in flaky_tests.groupby('project', observed=True, sort=True):
         print(f"PROJECT: {project}")
         print("-" * (len(project) + 9))
         
-        for _, test in project_tests.iterrows():
-            print(f"  Test: {test['test_name']}")
-            print(f"  Outcome: {test['outcome']}")
-            print(f"  Fails in: {', '.join(test['failing_environments'])}")
-            print(f"  Passes in: {', '.join(test['passing_environments'])}")
+        columns = project_tests[['test_name', 'outcome', 'failing_environments', 'passing_environments']]
+        for test_name, outcome, failing_envs, passing_envs in columns.itertuples(index=False, name=None):
+            print(f"  Test: {test_name}")
+            print(f"  Outcome: {outcome}")
+            print(f"  Fails in: {', '.join(failing_envs)}")
+            print(f"  Passes in: {', '.join(passing_envs)}")
             print()
     
     # Summary statistics
@@ -136,14 +268,21 @@ def print_flaky_analysis(flaky_tests: pd.DataFrame) -> None:
     for num_envs, count in env_stats.items():
         print(f"  Tests failing in {num_envs} environment(s): {count}")
     
-    outcome_stats = flaky_tests['outcome'].value_counts()
+    # outcome is categorical: drop outcomes that only non-flaky tests had
+    outcome_stats = flaky_tests['outcome'].value_counts()[lambda counts: counts > 0]
     print(f"\nDistribution by outcome type:")
     for outcome, count in outcome_stats.items():
         print(f"  {outcome}: {count}")
 
 def save_flaky_tests(flaky_tests: pd.DataFrame, output_file: str = "flaky_tests_report.csv") -> None:
     """
-    Saves flaky tests to a CSV file.
+    Saves flaky tests to a CSV file, plus a parquet copy next to it.
+    
+    The environment lists are written to the CSV as '|'-separated strings
+    (e.g. "macos-latest|ubuntu-latest") so every column is a plain string.
+    The parquet file keeps them as lists and is much faster to load for
+    tools that consume the report; it is skipped (with a message) if
+    pyarrow is missing or the file can't be written.
     
     Args:
         flaky_tests (pd.DataFrame): DataFrame containing flaky test results
@@ -151,8 +290,19 @@ def save_flaky_tests(flaky_tests: pd.DataFrame, output_file: str = "flaky_tests_
     """
     
     if not flaky_tests.empty:
-        flaky_tests.to_csv(output_file, index=False)
+        report = flaky_tests.assign(
+            failing_environments=flaky_tests['failing_environments'].map('|'.join),
+            passing_environments=flaky_tests['passing_environments'].map('|'.join),
+        )
+        report.to_csv(output_file, index=False)
         print(f"\nFlaky tests report saved to: {output_file}")
+        
+        parquet_file = os.path.splitext(output_file)[0] + ".parquet"
+        try:
+            flaky_tests.to_parquet(parquet_file, index=False)
+            print(f"Flaky tests report saved to: {parquet_file}")
+        except Exception as e:
+            print(f"Skipping parquet report: {e}")
 
 def main():
     """
@@ -162,17 +312,25 @@ def main():
     # You can modify this path to point to your CSV file
     csv_file_path = "final.csv"
     
+    # --no-cache always reruns the analysis instead of using the cache
+    args = sys.argv[1:]
+    use_cache = "--no-cache" not in args
+    args = [arg for arg in args if arg != "--no-cache"]
+    
     # If a command line argument is provided, use it as the file path
-    if len(sys.argv) > 1:
-        csv_file_path = sys.argv[1]
+    if args:
+        csv_file_path = args[0]
     
     print("Flaky Test Analyzer")
     print("=" * 50)
     print(f"Analyzing file: {csv_file_path}")
     print()
     
-    # Analyze flaky tests
-    flaky_tests = analyze_flaky_tests(csv_file_path)
+    # Analyze flaky tests (reusing the cached result if the file is unchanged)
+    if use_cache:
+        flaky_tests = analyze_flaky_tests_cached(csv_file_path)
+    else:
+        flaky_tests = analyze_flaky_tests(csv_file_path)
     
     # Print detailed analysis
     print_flaky_analysis(flaky_tests)